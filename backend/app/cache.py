@@ -1,112 +1,487 @@
-from datetime import datetime, timedelta
-from typing import Any, Dict, Optional, Tuple, List
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, List
+from weakref import WeakValueDictionary
+from starlette.requests import Request
+from starlette.responses import Response
+import asyncio
+import functools
+import hashlib
+import inspect
+import itertools
+import random
 import threading
 import time
+import orjson
+import zstandard
+
+from .redis_cache import L1_TTL_SECONDS, redis_cache
+
+# zstd level for cached payloads; level 3 is fast to encode and decode
+ZSTD_LEVEL = 3
+
+# Number of shards; must be a power of two so the shard index is a mask
+NUM_SHARDS = 16
+
+# Sentinel for a missing entry, so a hit costs a single dict lookup
+_MISSING = object()
+
+# Every SWEEP_EVERY writes to a shard, evict expired entries among its
+# SWEEP_SAMPLE oldest keys; anything else expires lazily on access
+SWEEP_EVERY = 64
+SWEEP_SAMPLE = 8
+
+# TTLs are randomized by up to this fraction either way, so entries cached
+# together (e.g. after a restart) don't all expire, and miss, at once
+TTL_JITTER = 0.1
+
+def jitter_ttl(ttl_seconds: float) -> float:
+    """
+    Spread a TTL by up to TTL_JITTER either way.
+    """
+    return ttl_seconds * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)
+
+class _Shard:
+    """
+    One slice of the cache with its own lock and hit/miss counters.
+    """
+    __slots__ = ('data', 'lock', 'hits', 'misses', 'writes')
+
+    def __init__(self):
+        # key -> (value, expiration, fresh until), as time.monotonic()
+        # timestamps; entries past "fresh until" are stale but still served
+        # by get_or_compute_async while it refreshes them
+        self.data: Dict[str, Tuple[Any, float, float]] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def sweep(self, now: float) -> None:
+        """
+        Evict expired entries among the oldest few keys. Caller holds the lock.
+        """
+        expired_keys = [
+            k for k, (_, exp, _) in itertools.islice(self.data.items(), SWEEP_SAMPLE) if now > exp
+        ]
+        for key in expired_keys:
+            del self.data[key]
+
+class _KeyLock:
+    """
+    Per-key lock; a plain threading.Lock can't be weakly referenced.
+    """
+    __slots__ = ('lock', '__weakref__')
+
+    def __init__(self):
+        self.lock = threading.Lock()
 
 class Cache:
     """
     A simple in-memory cache with time-based expiration.
+
+    Keys are spread over a fixed number of shards, each guarded by its own
+    lock, so concurrent requests for different keys don't contend.
     """
-    def __init__(self, default_ttl_seconds: int = 86400):  # Default TTL: 24 hours
-        self._cache: Dict[str, Tuple[Any, datetime]] = {}
-        self._default_ttl = timedelta(seconds=default_ttl_seconds)
-        self._lock = threading.Lock()
-        self._hits = 0
-        self._misses = 0
-    
+    def __init__(self, default_ttl_seconds: int = 86400, num_shards: int = NUM_SHARDS):  # Default TTL: 24 hours
+        if num_shards <= 0 or num_shards & (num_shards - 1):
+            raise ValueError("num_shards must be a power of two")
+        self._default_ttl = float(default_ttl_seconds)
+        self._shards = [_Shard() for _ in range(num_shards)]
+        self._mask = num_shards - 1
+        # Locks serializing value generation per key, dropped once unused
+        self._key_locks: "WeakValueDictionary[str, _KeyLock]" = WeakValueDictionary()
+        self._key_locks_lock = threading.Lock()
+        # Futures of async fills in progress, shared by concurrent misses
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._refresh_tasks: "set[asyncio.Task[Any]]" = set()
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) & self._mask]
+
     def get(self, key: str) -> Optional[Any]:
         """
         Get a value from the cache if it exists and hasn't expired.
         """
-        with self._lock:
-            if key not in self._cache:
-                self._misses += 1
+        s = self._shard(key)
+        with s.lock:
+            entry = s.data.get(key, _MISSING)
+            if entry is _MISSING:
+                s.misses += 1
                 return None
-            
-            value, expiration = self._cache[key]
-            if datetime.now() > expiration:
-                del self._cache[key]
-                self._misses += 1
+
+            value, expiration, _ = entry
+            if time.monotonic() > expiration:
+                del s.data[key]
+                s.misses += 1
                 return None
-            
-            self._hits += 1
+
+            s.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None, stale_seconds: int = 0) -> None:
+        """
+        Set a value in the cache with an optional TTL in seconds, spread by
+        jitter_ttl. With stale_seconds, the entry is kept that much longer
+        past its TTL as a stale value for get_or_compute_async.
+        """
+        ttl = jitter_ttl(ttl_seconds if ttl_seconds is not None else self._default_ttl)
+        now = time.monotonic()
+
+        s = self._shard(key)
+        with s.lock:
+            s.data[key] = (value, now + ttl + stale_seconds, now + ttl)
+            s.writes += 1
+            # Amortized cleanup, so there's no need for a sweeper thread
+            if s.writes % SWEEP_EVERY == 0:
+                s.sweep(now)
+
+    def get_or_compute(self, key: str, producer: Callable[[], Any], ttl_seconds: Optional[int] = None) -> Any:
+        """
+        Get a value from the cache, calling producer() to fill it on a miss.
+
+        Concurrent callers missing on the same key wait for the first one
+        instead of all running the producer.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._key_locks_lock:
+            key_lock = self._key_locks.get(key)
+            if key_lock is None:
+                key_lock = _KeyLock()
+                self._key_locks[key] = key_lock
+
+        with key_lock.lock:
+            # Another caller may have filled it while we waited
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            value = producer()
+            self.set(key, value, ttl_seconds)
+            return value
+
+    def _get_with_freshness(self, key: str) -> Tuple[Optional[Any], bool]:
+        """
+        Like get, but also return whether the entry is still fresh.
+        """
+        s = self._shard(key)
+        with s.lock:
+            entry = s.data.get(key, _MISSING)
+            now = time.monotonic()
+            if entry is _MISSING or now > entry[1]:
+                if entry is not _MISSING:
+                    del s.data[key]
+                s.misses += 1
+                return None, False
+
+            s.hits += 1
+            return entry[0], now <= entry[2]
+
+    def _start_fill(self, key: str) -> "asyncio.Future[Any]":
+        """
+        Publish a fill of key in _inflight so concurrent callers await it.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    async def _fill(
+        self,
+        key: str,
+        future: "asyncio.Future[Any]",
+        producer: Callable[[], Awaitable[Any]],
+        ttl_seconds: Optional[int],
+        stale_seconds: int
+    ) -> Any:
+        """
+        Await producer(), store its value and resolve the fill's future.
+        """
+        try:
+            value = await producer()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            self.set(key, value, ttl_seconds, stale_seconds)
+            future.set_result(value)
             return value
-    
-    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        finally:
+            del self._inflight[key]
+
+    def _fill_in_background(
+        self,
+        key: str,
+        producer: Callable[[], Awaitable[Any]],
+        ttl_seconds: Optional[int],
+        stale_seconds: int
+    ) -> "asyncio.Future[Any]":
         """
-        Set a value in the cache with an optional TTL in seconds.
+        Run a fill of key in its own task, so no caller's cancellation
+        cancels it, and return the future it resolves.
+        """
+        future = self._start_fill(key)
+        task = asyncio.get_running_loop().create_task(self._fill(key, future, producer, ttl_seconds, stale_seconds))
+        # Hold a reference until it's done; callers see a failure through the
+        # future, so the task's exception is only retrieved to avoid a warning
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return future
+
+    async def get_or_compute_async(
+        self,
+        key: str,
+        producer: Callable[[], Awaitable[Any]],
+        ttl_seconds: Optional[int] = None,
+        stale_seconds: int = 0
+    ) -> Any:
+        """
+        Async get_or_compute: await producer() to fill the key on a miss.
+
+        Concurrent misses on the same key await the in-flight call rather
+        than each starting their own, so an expired hot key costs one
+        upstream query instead of one per waiting request.
+
+        With stale_seconds, for that long after the TTL the stale value is
+        returned immediately while producer() refreshes it in the background.
         """
-        ttl = timedelta(seconds=ttl_seconds) if ttl_seconds is not None else self._default_ttl
-        expiration = datetime.now() + ttl
-        
-        with self._lock:
-            self._cache[key] = (value, expiration)
-    
+        value, fresh = self._get_with_freshness(key)
+        if value is not None:
+            if not fresh and key not in self._inflight:
+                # A failed refresh keeps the stale value
+                self._fill_in_background(key, producer, ttl_seconds, stale_seconds)
+            return value
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._fill_in_background(key, producer, ttl_seconds, stale_seconds)
+        # shield, so a caller giving up, the first one included, doesn't
+        # cancel the shared call
+        return await asyncio.shield(future)
+
     def delete(self, key: str) -> None:
         """
         Delete a key from the cache.
         """
-        with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-    
+        s = self._shard(key)
+        with s.lock:
+            s.data.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        """
+        Delete all keys starting with prefix, returning how many were deleted.
+        """
+        deleted = 0
+        for s in self._shards:
+            with s.lock:
+                keys = [k for k in s.data if k.startswith(prefix)]
+                for key in keys:
+                    del s.data[key]
+                deleted += len(keys)
+        return deleted
+
     def clear(self) -> None:
         """
         Clear all items from the cache.
         """
-        with self._lock:
-            self._cache.clear()
-            self._hits = 0
-            self._misses = 0
-    
+        for s in self._shards:
+            with s.lock:
+                s.data.clear()
+                s.hits = 0
+                s.misses = 0
+
     def cleanup_expired(self) -> None:
         """
         Remove all expired items from the cache.
         """
-        now = datetime.now()
-        with self._lock:
-            expired_keys = [k for k, (_, exp) in self._cache.items() if now > exp]
-            for key in expired_keys:
-                del self._cache[key]
-    
+        now = time.monotonic()
+        for s in self._shards:
+            with s.lock:
+                expired_keys = [k for k, (_, exp, _) in s.data.items() if now > exp]
+                for key in expired_keys:
+                    del s.data[key]
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Get cache statistics.
         """
-        with self._lock:
-            total_requests = self._hits + self._misses
-            hit_rate = self._hits / total_requests if total_requests > 0 else 0
-            
-            # Count expired items
-            now = datetime.now()
-            expired_count = sum(1 for _, (_, exp) in self._cache.items() if now > exp)
-            
-            return {
-                "size": len(self._cache),
-                "hits": self._hits,
-                "misses": self._misses,
-                "hit_rate": hit_rate,
-                "expired_count": expired_count
-            }
-    
+        size = hits = misses = expired_count = 0
+        now = time.monotonic()
+        for s in self._shards:
+            with s.lock:
+                size += len(s.data)
+                hits += s.hits
+                misses += s.misses
+                # Count expired items
+                expired_count += sum(1 for _, exp, _ in s.data.values() if now > exp)
+
+        total_requests = hits + misses
+        hit_rate = hits / total_requests if total_requests > 0 else 0
+
+        return {
+            "size": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hit_rate,
+            "expired_count": expired_count
+        }
+
     def get_keys(self) -> List[str]:
         """
         Get all cache keys.
         """
-        with self._lock:
-            return list(self._cache.keys())
+        keys: List[str] = []
+        for s in self._shards:
+            with s.lock:
+                keys.extend(s.data.keys())
+        return keys
 
 # Create a global cache instance
-cache = Cache(default_ttl_seconds=86400 * 7)  # Default TTL: 7 days 
+cache = Cache(default_ttl_seconds=86400 * 7)  # Default TTL: 7 days
+
+def _json_default(obj: Any) -> Any:
+    # Pydantic models returned by handlers
+    if hasattr(obj, "dict"):
+        return obj.dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps_json(obj: Any) -> bytes:
+    """
+    Serialize an object to JSON bytes with orjson.
+    """
+    return orjson.dumps(obj, default=_json_default)
+
+# zstd (de)compressor objects aren't safe to share between threads
+_zstd_local = threading.local()
+
+def _compress(body: bytes) -> bytes:
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor.compress(body)
+
+def _decompress(blob: bytes) -> bytes:
+    decompressor = getattr(_zstd_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    return decompressor.decompress(blob)
+
+# Browser/CDN cache lifetime for cached JSON responses
+DEFAULT_MAX_AGE = 3600
+# How long a stale response may still be served while it's revalidated
+STALE_WHILE_REVALIDATE = 86400
+
+def make_etag(body: bytes) -> str:
+    """
+    Strong ETag for a response body.
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
 
-def get_cache(key: str) -> Optional[Any]:
+def json_response(
+    body: bytes,
+    etag: str,
+    request: Optional[Request],
+    max_age: int = DEFAULT_MAX_AGE
+) -> Response:
     """
-    Get a value from the global cache.
+    Return JSON bytes with ETag and Cache-Control headers, or an empty 304
+    if the request's If-None-Match already has this ETag.
     """
-    return cache.get(key)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}, stale-while-revalidate={STALE_WHILE_REVALIDATE}"
+    }
+    if request is not None and _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-def set_cache(key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+def cached(
+    ttl_seconds: Optional[int] = None,
+    key_fn: Optional[Callable[..., str]] = None,
+    exclude: Tuple[str, ...] = ("supabase", "request"),
+    as_json: bool = False,
+    compress: bool = False,
+    max_age: int = DEFAULT_MAX_AGE,
+    stale_seconds: int = 0
+):
     """
-    Set a value in the global cache.
+    Memoize a function's result in the global cache.
+
+    The key is the function name plus its arguments, ignoring the ones named
+    in exclude (e.g. injected clients), unless a key_fn is given. Only async
+    functions, such as FastAPI route handlers, can be decorated.
+
+    With as_json, the result is cached as serialized JSON bytes together with
+    an ETag and returned as a raw Response with ETag and Cache-Control
+    headers; a matching If-None-Match gets an empty 304. compress additionally
+    stores the bytes zstd-compressed. Route handlers get the incoming request
+    injected for this if they don't already take one. If Redis is configured,
+    JSON results are also stored there for ttl_seconds and shared between
+    workers. stale_seconds serves an expired result for that much longer
+    while it's refreshed in the background.
     """
-    cache.set(key, value, ttl_seconds) 
\ No newline at end of file
+    def decorator(fn):
+        if not asyncio.iscoroutinefunction(fn):
+            raise TypeError(f"cached() needs an async function, got {fn.__name__}")
+        sig = inspect.signature(fn)
+        inject_request = as_json and "request" not in sig.parameters
+        ttl = ttl_seconds if ttl_seconds is not None else cache._default_ttl
+        # With Redis as the shared second level, in-process entries of JSON
+        # responses are kept only briefly
+        l1_ttl = min(ttl, L1_TTL_SECONDS) if redis_cache is not None and as_json else ttl_seconds
+
+        def make_key(args, kwargs) -> str:
+            if key_fn is not None:
+                return key_fn(*args, **kwargs)
+            params = sorted((k, v) for k, v in kwargs.items() if k not in exclude)
+            return f"{fn.__name__}:{args}:{params}"
+
+        def make_payload(value: Any) -> Tuple[bytes, str]:
+            body = dumps_json(value)
+            return (_compress(body) if compress else body, make_etag(body))
+
+        def respond(payload: Tuple[bytes, str], request: Optional[Request]) -> Response:
+            body, etag = payload
+            # No need to decompress the body for a 304
+            if compress and not (request is not None and _etag_matches(request.headers.get("if-none-match"), etag)):
+                body = _decompress(body)
+            return json_response(body, etag, request, max_age)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            request = kwargs.pop("request", None) if inject_request else kwargs.get("request")
+            key = make_key(args, kwargs)
+
+            async def produce():
+                if as_json and redis_cache is not None:
+                    body = await redis_cache.get(key)
+                    if body is not None:
+                        return (body, make_etag(_decompress(body) if compress else body))
+                value = await fn(*args, **kwargs)
+                if not as_json:
+                    return value
+                payload = make_payload(value)
+                if redis_cache is not None:
+                    await redis_cache.set(key, payload[0], jitter_ttl(ttl))
+                return payload
+
+            value = await cache.get_or_compute_async(key, produce, l1_ttl, stale_seconds)
+            return respond(value, request) if as_json else value
+
+        if inject_request:
+            request_param = inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+            wrapper.__signature__ = sig.replace(parameters=[*sig.parameters.values(), request_param])
+        return wrapper
+    return decorator
\ No newline at end of file
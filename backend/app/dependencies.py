@@ -1,5 +1,12 @@
-from supabase import Client, create_client
+from fastapi import Header, HTTPException
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from httpx import AsyncClient, AsyncHTTPTransport, Limits, Request, Response
+from typing import Optional
+import asyncio
 import os
+import random
+import secrets
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -12,10 +19,69 @@ supabase_key = os.getenv("SUPABASE_KEY")
 if not supabase_url or not supabase_key:
     raise ValueError("Supabase credentials not found in environment variables")
 
-supabase: Client = create_client(supabase_url, supabase_key)
+# Connection pool shared by every request to Supabase. Idle connections are
+# kept for a minute (httpx defaults to 5 seconds), so requests a few seconds
+# apart don't each pay for a new TLS handshake
+SUPABASE_POOL_LIMITS = Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
+# Responses from Supabase that are worth retrying: rate limited, or the
+# gateway briefly unavailable
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.1  # seconds
+
+class RetryTransport(AsyncHTTPTransport):
+    """
+    Transport retrying rate-limited or unavailable responses, up to
+    MAX_ATTEMPTS requests in all, with jittered exponential backoff (about
+    100ms, then 200ms). The API only reads (selects and stable functions),
+    so every request is safe to repeat.
+    """
+    async def handle_async_request(self, request: Request) -> Response:
+        for attempt in range(MAX_ATTEMPTS):
+            response = await super().handle_async_request(request)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_ATTEMPTS - 1:
+                return response
+            await response.aclose()
+            await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt + random.uniform(0, RETRY_BASE_DELAY / 2))
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """
+    Async PostgREST client whose HTTP session uses SUPABASE_POOL_LIMITS and
+    retries through RetryTransport
+    """
+    def create_session(self, base_url, headers, timeout) -> AsyncClient:
+        return AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=RetryTransport(limits=SUPABASE_POOL_LIMITS),
+        )
+
+# Created once per process, so requests reuse pooled connections instead
+# of paying for a new TLS handshake each time
+supabase = PooledPostgrestClient(
+    f"{supabase_url}/rest/v1",
+    headers={
+        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+        "apikey": supabase_key,
+        "Authorization": f"Bearer {supabase_key}",
+    },
+)
 
 def get_supabase():
     """
     Dependency function to get the Supabase client
     """
-    return supabase 
\ No newline at end of file
+    return supabase
+
+# Secret for the admin endpoints that delete cached entries, passed in the
+# X-Admin-Token header; those endpoints are disabled when it isn't set
+admin_token = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Dependency rejecting requests without the admin token
+    """
+    if not admin_token or x_admin_token is None or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
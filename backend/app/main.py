@@ -1,18 +1,24 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import asyncio
-import threading
-import time
+import logging
 
 # Import routers
 from .routers import trade, tariffs, market
-from .cache import cache
+from .dependencies import supabase
+from .redis_cache import redis_cache
+from .utils import country_reference
+
+logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Tariff Map API",
     description="API for accessing trade and tariff data",
-    version="1.0.0"
+    version="1.0.0",
+    # Encode responses with orjson rather than the stdlib json module
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -33,25 +39,42 @@ app.include_router(market.router)
 async def root():
     return {"message": "Tariff Map API is running"}
 
-# Background task for cache cleanup
-def run_cache_cleanup():
-    while True:
-        try:
-            cache.cleanup_expired()
-            # Sleep for 1 hour before next cleanup
-            time.sleep(3600)
-        except Exception as e:
-            print(f"Error in cache cleanup: {str(e)}")
-            # Sleep for 5 minutes before retrying
-            time.sleep(300)
+def warm_reference_data():
+    # Build the lookup tables over the bundled JSON, which are otherwise
+    # built by the first request that needs each one
+    country_reference.get_iso3_to_id()
+    country_reference.get_id_to_iso3()
+    country_reference.get_id_to_name()
+    country_reference.get_id_to_trade_region()
+    trade.load_trump_tariffs()
+    tariffs.us_tariff_map_payload()
+
+async def warm_cache():
+    try:
+        warm_reference_data()
+        if redis_cache is not None:
+            try:
+                await redis_cache.ping()
+            except Exception as e:
+                # Redis errors are treated as misses, so keep warming
+                logger.warning("Redis ping failed: %s", e)
+        # Prefetch the most requested map (US, latest year) so the first
+        # visitor after a restart doesn't wait on Supabase
+        await trade.get_compact_deficit_map(reporter_id=840, year=None, supabase=supabase)
+    except Exception as e:
+        logger.warning("Cache warm-up failed: %s", e)
 
 @app.on_event("startup")
 async def startup_event():
-    # Start the cache cleanup thread
-    cleanup_thread = threading.Thread(target=run_cache_cleanup, daemon=True)
-    cleanup_thread.start()
-    cache.clear()
-    print("Cache cleared on startup")
+    # In the background, so startup doesn't wait on the database
+    app.state.warm_cache_task = asyncio.create_task(warm_cache())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Close the pooled connections of the Supabase client
+    await supabase.aclose()
+    if redis_cache is not None:
+        await redis_cache.close()
 
 if __name__ == "__main__":
     import uvicorn
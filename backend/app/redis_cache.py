@@ -0,0 +1,121 @@
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+import logging
+import os
+import re
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Only the in-process cache is used
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Prefix for every key, so the cache can share a Redis instance
+NAMESPACE = "tariff-map:"
+
+# Connections per worker; when all are busy, a get or set fails fast and
+# counts as a miss
+MAX_CONNECTIONS = 50
+
+# TTL of the in-process cache in front of Redis, so every worker picks up
+# entries refreshed by another within this many seconds
+L1_TTL_SECONDS = 60
+
+def _escape_pattern(text: str) -> str:
+    """
+    Escape the glob characters of a SCAN MATCH pattern, so text matches literally.
+    """
+    return re.sub(r"([*?\[\]\\])", r"\\\1", text)
+
+class RedisBackend:
+    """
+    Cache of serialized responses in Redis, shared by all workers.
+
+    Errors are logged and treated as misses, so the API keeps working (from
+    the database) if Redis is unavailable.
+    """
+    def __init__(self, url: str, namespace: str = NAMESPACE):
+        self._client = aioredis.from_url(url, max_connections=MAX_CONNECTIONS)
+        self._namespace = namespace
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Get a value from Redis, or None on a miss or error.
+        """
+        try:
+            return await self._client.get(self._namespace + key)
+        except Exception as e:
+            logger.warning("Redis get failed: %s", e)
+            return None
+
+    async def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Set a value in Redis with an optional TTL in seconds.
+        """
+        try:
+            await self._client.set(self._namespace + key, value, ex=int(ttl_seconds) if ttl_seconds else None)
+        except Exception as e:
+            logger.warning("Redis set failed: %s", e)
+
+    async def clear(self) -> None:
+        """
+        Delete all keys in this cache's namespace.
+        """
+        keys = [key async for key in self._client.scan_iter(match=self._namespace + "*")]
+        if keys:
+            await self._client.delete(*keys)
+
+    async def delete_prefix(self, prefix: str) -> int:
+        """
+        Delete all keys starting with prefix, returning how many were deleted.
+        """
+        keys = [key async for key in self._client.scan_iter(match=_escape_pattern(self._namespace + prefix) + "*")]
+        if keys:
+            await self._client.unlink(*keys)
+        return len(keys)
+
+    async def get_keys(self) -> List[str]:
+        """
+        Get all cache keys, without the namespace.
+        """
+        prefix_len = len(self._namespace)
+        return [
+            key.decode()[prefix_len:]
+            async for key in self._client.scan_iter(match=self._namespace + "*")
+        ]
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics. Hits and misses are server-wide.
+        """
+        keys = await self.get_keys()
+        info = await self._client.info("stats")
+        hits = info.get("keyspace_hits", 0)
+        misses = info.get("keyspace_misses", 0)
+        total_requests = hits + misses
+        return {
+            "size": len(keys),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total_requests if total_requests > 0 else 0
+        }
+
+    async def ping(self) -> None:
+        """
+        Check the connection, opening the first pooled one.
+        """
+        await self._client.ping()
+
+    async def close(self) -> None:
+        await self._client.close()
+
+# Enabled by setting REDIS_URL (e.g. redis://localhost:6379/0)
+redis_url = os.getenv("REDIS_URL")
+if redis_url and aioredis is None:
+    logger.warning("REDIS_URL is set but the redis package is not installed")
+
+redis_cache: Optional[RedisBackend] = RedisBackend(redis_url) if redis_url and aioredis is not None else None
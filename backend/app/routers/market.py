@@ -1,8 +1,10 @@
 from fastapi import APIRouter
+import asyncio
 from ..services.market_data import get_market_data
 
 router = APIRouter()
 
 @router.get("/market-data")
 async def market_data():
-    return get_market_data() 
\ No newline at end of file
+    # The Yahoo Finance fetch blocks, so run it off the event loop
+    return await asyncio.to_thread(get_market_data) 
\ No newline at end of file
@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import Dict, List, Optional
-from datetime import date
-from supabase import Client
-import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Dict, List, Optional, Tuple
+from postgrest import AsyncPostgrestClient
+from functools import lru_cache
+import logging
 
 from ..dependencies import get_supabase
+from ..schemas.tariffs import CountryPair
 from ..utils.country_reference import (
     get_iso3_by_id,
     get_name_by_id,
     get_trade_region_by_id,
-    load_country_reference
+    get_map_fields_by_iso3
 )
 from ..utils.json_cache import json_cache
+from ..cache import cached, dumps_json, json_response, make_etag
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/tariffs",
@@ -19,19 +23,39 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def format_pair_tariff(imposing_country_id: int, target_country_id: int, target_iso3: str, tariff_data: Dict) -> Dict:
+    """Format a tbl_trump_tariff row as a country pair tariff response"""
+    return {
+        "imposing_country_id": imposing_country_id,
+        "target_country_id": target_country_id,
+        "target_iso3": target_iso3,
+        "target_name": get_name_by_id(target_country_id),
+        "matched_code": tariff_data["partner_iso3"],  # This could be country or region code
+        "matched_name": tariff_data["partner_name"],
+        "is_region_tariff": tariff_data["partner_iso3"] != target_iso3,
+        "claimed_tariff": tariff_data["trump_claimed_tariff"],
+        "reciprocal_tariff": tariff_data["us_reciprocal_tariff"]
+    }
+
 @router.get("/year/{year}")
+@cached(ttl_seconds=86400, as_json=True, compress=True)
 async def get_tariffs_by_year(
     year: int, 
     country_id: Optional[int] = Query(None, description="Optional country ID to filter by"),
-    supabase: Client = Depends(get_supabase)
+    limit: int = Query(1000, ge=1, le=5000, description="Page size when no country is given"),
+    offset: int = Query(0, ge=0, description="Page offset when no country is given"),
+    supabase: AsyncPostgrestClient = Depends(get_supabase)
 ):
     """
     Get all tariff rates for a specific year, optionally filtered by country
+
+    Without a country the whole year is too large for one response, so it
+    is paged with limit/offset; next_offset is null on the last page.
     """
     try:
-        # Convert year to date range
-        start_date = date(year, 1, 1)
-        end_date = date(year, 12, 31)
+        # Convert year to an ISO date range
+        start_date = f"{year:04d}-01-01"
+        end_date = f"{year:04d}-12-31"
         
         if country_id:
             # Get country ISO3 and trade region
@@ -44,8 +68,8 @@ async def get_tariffs_by_year(
             # Build query considering both country and its trade region
             query = supabase.table("tbl_tariff_rates") \
                 .select("*") \
-                .gte("tariff_date", start_date.isoformat()) \
-                .lte("tariff_date", end_date.isoformat())
+                .gte("tariff_date", start_date) \
+                .lte("tariff_date", end_date)
             
             # Handle trade region in the query
             if trade_region:
@@ -56,37 +80,43 @@ async def get_tariffs_by_year(
                     f"target_region.eq.{trade_region}"
                 )
             else:
-                query = query.or_(
-                    f"imposing_iso3.eq.{country_iso3},target_iso3.eq.{country_iso3}"
-                )
+                # Tariffs imposed by or on the country, via the GIN index on involved_iso3
+                query = query.contains("involved_iso3", [country_iso3])
         else:
-            # If no country specified, get all tariffs for the year
+            # If no country specified, get one page of the year's tariffs,
+            # in a stable order so pages don't overlap
             query = supabase.table("tbl_tariff_rates") \
                 .select("*") \
-                .gte("tariff_date", start_date.isoformat()) \
-                .lte("tariff_date", end_date.isoformat())
+                .gte("tariff_date", start_date) \
+                .lte("tariff_date", end_date) \
+                .order("tariff_date,id") \
+                .range(offset, offset + limit)  # end is exclusive in postgrest-py 0.10
         
-        result = query.execute()
+        result = await query.execute()
         
-        if not result.data:
+        if not result.data and not (country_id is None and offset > 0):
             country_text = f" for country ID {country_id}" if country_id else ""
             raise HTTPException(status_code=404, detail=f"No tariff data found for {year}{country_text}")
         
-        return {
+        response = {
             "year": year,
             "country_id": country_id,
             "tariff_rates": result.data
         }
+        if not country_id:
+            response["next_offset"] = offset + limit if len(result.data) == limit else None
+        return response
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching tariff rates: {str(e)}")
 
 @router.get("/country-pair/{imposing_country_id}/{target_country_id}")
+@cached(ttl_seconds=3600, as_json=True)
 async def get_country_pair_tariff(
     imposing_country_id: int, 
     target_country_id: int,
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_supabase)
 ):
     """Get tariff rates between two countries or regions"""
     try:
@@ -104,23 +134,17 @@ async def get_country_pair_tariff(
         if not target_iso3:
             raise HTTPException(status_code=400, detail="Invalid target country ID")
             
-        print(f"Debug - Looking up tariffs for target ISO3: {target_iso3}, region: {target_region}")
+        logger.debug("Looking up tariffs for target ISO3: %s, region: %s", target_iso3, target_region)
         
-        # Query the trump tariff table - first try exact country match
-        result = supabase.table("tbl_trump_tariff") \
+        # Query the trump tariff table for the country and its trade region
+        # (if any) in one round trip
+        codes = [target_iso3] + ([target_region] if target_region else [])
+        result = await supabase.table("tbl_trump_tariff") \
             .select("partner_iso3, partner_name, trump_claimed_tariff, us_reciprocal_tariff") \
-            .eq("partner_iso3", target_iso3) \
+            .in_("partner_iso3", codes) \
             .execute()
             
-        # If no direct country match and country has a trade region, try the region
-        if not result.data and target_region:
-            print(f"Debug - No country match found, trying region: {target_region}")
-            result = supabase.table("tbl_trump_tariff") \
-                .select("partner_iso3, partner_name, trump_claimed_tariff, us_reciprocal_tariff") \
-                .eq("partner_iso3", target_region) \
-                .execute()
-            
-        print(f"Debug - Query result: {result.data}")
+        logger.debug("Query result: %s", result.data)
         
         if not result.data:
             error_msg = f"No tariff data found between US and "
@@ -129,54 +153,96 @@ async def get_country_pair_tariff(
                 error_msg += f" or its trade region {target_region}"
             raise HTTPException(status_code=404, detail=error_msg)
         
-        tariff_data = result.data[0]
-        return {
-            "imposing_country_id": imposing_country_id,
-            "target_country_id": target_country_id,
-            "target_iso3": target_iso3,
-            "target_name": get_name_by_id(target_country_id),
-            "matched_code": tariff_data["partner_iso3"],  # This could be country or region code
-            "matched_name": tariff_data["partner_name"],
-            "is_region_tariff": tariff_data["partner_iso3"] != target_iso3,
-            "claimed_tariff": tariff_data["trump_claimed_tariff"],
-            "reciprocal_tariff": tariff_data["us_reciprocal_tariff"]
-        }
+        # Prefer the exact country match, falling back to the region
+        tariff_data = next(
+            (item for item in result.data if item["partner_iso3"] == target_iso3),
+            result.data[0]
+        )
+        
+        return format_pair_tariff(imposing_country_id, target_country_id, target_iso3, tariff_data)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Debug - Error occurred: {str(e)}")
+        logger.debug("Error occurred: %s", e)
         raise HTTPException(status_code=500, detail=f"Error fetching tariff rate: {str(e)}")
 
+@router.post("/country-pairs")
+async def get_country_pair_tariffs(
+    pairs: List[CountryPair],
+    supabase: AsyncPostgrestClient = Depends(get_supabase)
+):
+    """
+    Get tariff rates for several country pairs with a single query.
+    Pairs without tariff data (including non-US imposing countries) are left out.
+    """
+    try:
+        # Resolve every target up front; only US imposed tariffs are available
+        targets = []
+        codes = set()
+        for pair in pairs:
+            if pair.imposing_country_id != 840:  # 840 is USA
+                continue
+            
+            target_iso3 = get_iso3_by_id(pair.target_country_id)
+            if not target_iso3:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid target country ID {pair.target_country_id}"
+                )
+            target_region = get_trade_region_by_id(pair.target_country_id)
+            
+            targets.append((pair, target_iso3, target_region))
+            codes.add(target_iso3)
+            if target_region:
+                codes.add(target_region)
+        
+        if not codes:
+            return {"tariffs": []}
+        
+        result = await supabase.table("tbl_trump_tariff") \
+            .select("partner_iso3, partner_name, trump_claimed_tariff, us_reciprocal_tariff") \
+            .in_("partner_iso3", sorted(codes)) \
+            .execute()
+        
+        by_code = {item["partner_iso3"]: item for item in result.data}
+        
+        # Prefer an exact country match, falling back to the trade region
+        tariffs = []
+        for pair, target_iso3, target_region in targets:
+            tariff_data = by_code.get(target_iso3) or by_code.get(target_region)
+            if tariff_data:
+                tariffs.append(format_pair_tariff(
+                    pair.imposing_country_id, pair.target_country_id, target_iso3, tariff_data
+                ))
+        
+        return {"tariffs": tariffs}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching tariff rates: {str(e)}")
+
 @router.get("/historical/{country_code}")
+@cached(as_json=True)
 async def get_historical_tariffs(
     country_code: str,
     partner: Optional[str] = Query(None, description="Optional partner country code to filter by"),
     start_year: Optional[int] = Query(None, description="Start year for historical data"),
     end_year: Optional[int] = Query(None, description="End year for historical data"),
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_supabase)
 ):
     """
     Get historical tariff rates for a country over a range of years
     """
     try:
-        # Build the query based on whether we're looking at tariffs imposed by or on the country
-        query = supabase.table("tbl_tariff_rates") \
-            .select("*") \
-            .or_(f"imposing_iso3.eq.{country_code},target_iso3.eq.{country_code}")
-        
-        # Filter by partner if provided
-        if partner:
-            query = query.or_(f"imposing_iso3.eq.{partner},target_iso3.eq.{partner}")
-        
-        # Add date range filters
-        if start_year:
-            start_date = date(start_year, 1, 1)
-            query = query.gte("tariff_date", start_date.isoformat())
-        if end_year:
-            end_date = date(end_year, 12, 31)
-            query = query.lte("tariff_date", end_date.isoformat())
-        
-        result = query.order("tariff_date", desc=False).execute()
+        # Yearly averages are computed in Postgres by get_historical_tariff_avg
+        # (see migrations/fn_get_historical_tariff_avg.sql)
+        rpc = await supabase.rpc("get_historical_tariff_avg", {
+            "country": country_code,
+            "partner": partner,
+            "start_year": start_year,
+            "end_year": end_year
+        })
+        result = await rpc.execute()
         
         if not result.data:
             partner_text = f"-{partner}" if partner else ""
@@ -185,31 +251,10 @@ async def get_historical_tariffs(
                 detail=f"No tariff data found for {country_code}{partner_text}"
             )
         
-        # Group by year and calculate average
-        yearly_data = {}
-        for item in result.data:
-            tariff_date = date.fromisoformat(item["tariff_date"])
-            year = tariff_date.year
-            
-            if year not in yearly_data:
-                yearly_data[year] = []
-            
-            if item["avg_tariff"] is not None:
-                yearly_data[year].append(item["avg_tariff"])
-        
-        # Format the response
-        historical_data = []
-        for year, tariffs in yearly_data.items():
-            if tariffs:
-                historical_data.append({
-                    "year": year,
-                    "avg_tariff": sum(tariffs) / len(tariffs)
-                })
-        
         return {
             "country_code": country_code,
             "partner": partner,
-            "historical_data": historical_data
+            "historical_data": result.data
         }
     except HTTPException:
         raise
@@ -217,30 +262,32 @@ async def get_historical_tariffs(
         raise HTTPException(status_code=500, detail=f"Error fetching historical tariff data: {str(e)}")
 
 @router.get("/highest/{year}")
+@cached(ttl_seconds=86400, as_json=True)
 async def get_highest_tariffs(
     year: int, 
     country_code: Optional[str] = Query(None, description="Optional country code to filter by"),
     limit: int = Query(10, description="Number of highest tariffs to return"),
-    supabase: Client = Depends(get_supabase)
+    supabase: AsyncPostgrestClient = Depends(get_supabase)
 ):
     """
     Get the highest tariff rates for a specific year, optionally filtered by country
     """
     try:
-        # Convert year to date range
-        start_date = date(year, 1, 1)
-        end_date = date(year, 12, 31)
+        # Convert year to an ISO date range
+        start_date = f"{year:04d}-01-01"
+        end_date = f"{year:04d}-12-31"
         
         query = supabase.table("tbl_tariff_rates") \
-            .select("*") \
-            .gte("tariff_date", start_date.isoformat()) \
-            .lte("tariff_date", end_date.isoformat())
+            .select("imposing_iso3, target_iso3, avg_tariff, tariff_date, product_group") \
+            .gte("tariff_date", start_date) \
+            .lte("tariff_date", end_date)
         
         # Filter by country if provided
         if country_code:
-            query = query.or_(f"imposing_iso3.eq.{country_code},target_iso3.eq.{country_code}")
+            # Tariffs imposed by or on the country, via the GIN index on involved_iso3
+            query = query.contains("involved_iso3", [country_code])
         
-        result = query.order("avg_tariff", desc=True).limit(limit).execute()
+        result = await query.order("avg_tariff", desc=True).limit(limit).execute()
         
         if not result.data:
             country_text = f" for {country_code}" if country_code else ""
@@ -268,124 +315,102 @@ async def get_highest_tariffs(
         raise HTTPException(status_code=500, detail=f"Error fetching highest tariff rates: {str(e)}")
 
 @router.get("/map")
-async def get_tariff_map(supabase: Client = Depends(get_supabase)):
+@cached(ttl_seconds=3600, as_json=True, compress=True)
+async def get_tariff_map(supabase: AsyncPostgrestClient = Depends(get_supabase)):
     """Get all tariff data for map visualization"""
     try:
-        result = supabase.table("tbl_trump_tariff") \
+        # Filter out any null values for us_reciprocal_tariff in the query
+        result = await supabase.table("tbl_trump_tariff") \
             .select("partner_iso3, partner_name, trump_claimed_tariff, us_reciprocal_tariff") \
+            .not_.is_("us_reciprocal_tariff", "null") \
             .execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="No tariff data found")
         
-        # Load country reference data
-        countries = load_country_reference()
-        iso3_to_id = {country['iso3_code']: country['id'] for country in countries.values()}
-        
-        # Filter out any null values for us_reciprocal_tariff
-        valid_data = [item for item in result.data if item["us_reciprocal_tariff"] is not None]
+        tariffs = []
+        for item in result.data:
+            # Country ID and region flag are precomputed per partner code
+            country_id, is_region = get_map_fields_by_iso3(item["partner_iso3"])
+            tariffs.append({
+                "country_id": country_id,
+                "country_code": item["partner_iso3"],
+                "country_name": item["partner_name"] or "Unknown",
+                "claimed_tariff": item["trump_claimed_tariff"],
+                "reciprocal_tariff": item["us_reciprocal_tariff"],
+                "is_region": is_region
+            })
         
-        return {
-            "tariffs": [
-                {
-                    "country_id": f"{iso3_to_id[item['partner_iso3']]:03d}" if item['partner_iso3'] in iso3_to_id else None,
-                    "country_code": item["partner_iso3"],
-                    "country_name": item["partner_name"] or "Unknown",
-                    "claimed_tariff": item["trump_claimed_tariff"],
-                    "reciprocal_tariff": item["us_reciprocal_tariff"],
-                    "is_region": len(item["partner_iso3"]) == 3 and item["partner_iso3"].endswith('U')  # Simple check for region codes like EUU
-                }
-                for item in valid_data
-            ]
-        }
+        return {"tariffs": tariffs}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Debug - Error occurred: {str(e)}")
+        logger.debug("Error occurred: %s", e)
         raise HTTPException(status_code=500, detail=f"Error fetching tariff map data: {str(e)}")
 
+@lru_cache(maxsize=1)
+def us_tariff_map_payload() -> Tuple[bytes, str]:
+    """
+    JSON body and ETag of /us-tariff-map, built once since the data file is static
+    """
+    # Get tariff data from cache
+    tariff_data = json_cache.get_trump_tariffs()
+    
+    # Format the response
+    body = dumps_json({
+        "tariffs": [
+            {
+                "country_id": f"{item['id']:03d}",  # Format as 3-digit string
+                "country_code": item["iso3_code"],
+                "country_name": item["name"],
+                "tariff_rate_1": float(item["tariff_rate_1"].strip("%")),
+                "tariff_rate_2": float(item["tariff_rate_2"].strip("%")),
+                "date_1": "2025-04-02",
+                "date_2": "2025-04-09"
+            }
+            for item in tariff_data
+        ]
+    })
+    return body, make_etag(body)
+
 @router.get("/us-tariff-map")
-async def get_us_tariff_map():
+async def get_us_tariff_map(request: Request):
     """
     Get US tariff data for map visualization
     Returns tariff rates for all countries with two dates
     """
     try:
-        # Get tariff data from cache
-        tariff_data = json_cache.get_trump_tariffs()
-        
-        # Format the response
-        return {
-            "tariffs": [
-                {
-                    "country_id": f"{item['id']:03d}",  # Format as 3-digit string
-                    "country_code": item["iso3_code"],
-                    "country_name": item["name"],
-                    "tariff_rate_1": float(item["tariff_rate_1"].strip("%")),
-                    "tariff_rate_2": float(item["tariff_rate_2"].strip("%")),
-                    "date_1": "2025-04-02",
-                    "date_2": "2025-04-09"
-                }
-                for item in tariff_data
-            ]
-        }
+        body, etag = us_tariff_map_payload()
+        # Static per deploy, so browsers may keep it for a day
+        return json_response(body, etag, request, max_age=86400)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching US tariff map data: {str(e)}")
 
 @router.get("/rankings")
-async def get_tariff_rankings(supabase: Client = Depends(get_supabase)):
+@cached(ttl_seconds=86400, as_json=True)
+async def get_tariff_rankings(supabase: AsyncPostgrestClient = Depends(get_supabase)):
     """
     Get tariff rates between US and its top trading partners
     """
     try:
-        # First get the top 5 trading partners by total trade volume
-        top_partners_query = (
-            supabase.table('view_trade_summary')
-            .select('partner_code, partner_name, partner_iso3, export_value_usd, import_value_usd')
-            .eq('reporter_code', 840)  # US code
-            .neq('partner_code', 0)    # Exclude World/global trade
-            .eq('year', 2023)  # Latest year
-            .order('export_value_usd', desc=True)  # Order by exports first
-            .limit(5)
-            .execute()
-        )
+        # Get the top 5 trading partners (by US exports) with the tariffs in
+        # both directions in one call; get_tariff_rankings (see
+        # migrations/fn_get_tariff_rankings.sql) joins them in and sorts the
+        # rows by total trade volume
+        rpc = await supabase.rpc('get_tariff_rankings', {'reporter': 'USA', 'yr': 2023, 'n': 5})
+        response = await rpc.execute()
         
-        # Get tariff rates for each partner
-        partner_tariffs = []
-        for partner in top_partners_query.data:
-            # Get tariff rate that partner charges on US imports
-            partner_tariff_on_us = (
-                supabase.table('view_tariff_summary')
-                .select('simple_average')
-                .eq('reporter_code', partner['partner_code'])
-                .eq('partner_code', 840)  # US code
-                .eq('tariff_type', 'AHS')
-                .eq('year', 2023)
-                .limit(1)
-                .execute()
-            )
-            
-            # Get US tariff rate on partner's imports
-            us_tariff_on_partner = (
-                supabase.table('view_tariff_summary')
-                .select('simple_average')
-                .eq('reporter_code', 840)  # US code
-                .eq('partner_code', partner['partner_code'])
-                .eq('tariff_type', 'AHS')
-                .eq('year', 2023)
-                .limit(1)
-                .execute()
-            )
-            
-            partner_tariffs.append({
+        partner_tariffs = [
+            {
                 "country_id": partner['partner_code'],
                 "country_name": partner['partner_name'],
                 "country_code": partner['partner_iso3'],
-                "total_trade": partner['export_value_usd'] + partner['import_value_usd'],
-                "tariff_on_us": partner_tariff_on_us.data[0]['simple_average'] if partner_tariff_on_us.data else None,
-                "us_tariff": us_tariff_on_partner.data[0]['simple_average'] if us_tariff_on_partner.data else None
-            })
-        
-        # Sort the final results by total trade volume
-        partner_tariffs.sort(key=lambda x: x['total_trade'], reverse=True)
+                "total_trade": partner['total_trade'],
+                "tariff_on_us": partner['tariff_on_us'],
+                "us_tariff": partner['reporter_tariff']
+            }
+            for partner in response.data
+        ]
         
         return {
             "partners": partner_tariffs
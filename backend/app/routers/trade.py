@@ -1,78 +1,154 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional, Dict, Any
-from ..dependencies import get_supabase
-from ..schemas.trade import Country, TradeSummary, TradeSummaryResponse, TradeDeficitMapResponse, TradeDeficitEntry, TariffInfo, TrumpTariffEntry
+from typing import List, Optional, Dict, Any, Tuple
+from ..dependencies import get_supabase, require_admin
+from ..schemas.trade import Country, TradeSummaryResponse, TradeDeficitMapResponse, CompactDeficitMapResponse, TariffInfo, TrumpTariffEntry
 from ..utils.country_reference import (
     load_country_reference,
-    get_iso3_by_id,
-    get_name_by_id,
-    get_trade_region_by_id
+    get_iso3_by_id
 )
 from ..utils.json_cache import json_cache
-from ..cache import cache
-import json
-from datetime import datetime
-from pathlib import Path
-from supabase import Client
+from ..cache import cache, cached
+from ..redis_cache import redis_cache
+import asyncio
+import logging
+from functools import lru_cache
+from postgrest import AsyncPostgrestClient
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/trade",
     tags=["trade"]
 )
 
-def load_trump_tariffs() -> List[Dict[str, Any]]:
-    """Load Trump tariff data from cache"""
-    return json_cache.get_trump_tariffs()
+# Tariff type shown in country details; the queries filter on it rather
+# than fetching it with every row
+DETAILS_TARIFF_TYPE = 'AHS'
+
+def format_tariff_info(tariff_data: Dict[str, Any]) -> TariffInfo:
+    """Format a view_tariff_summary row as TariffInfo"""
+    return TariffInfo(
+        year=tariff_data['year'],
+        tariff_type=DETAILS_TARIFF_TYPE,
+        simple_average=tariff_data['simple_average'],
+        weighted_average=tariff_data['weighted_average']
+    )
+
+# Trump tariff rate columns, with the date and description used when the
+# commentary has none
+TRUMP_TARIFF_RATES = (
+    ('tariff_rate_1', '2025-04-02', 'First Trump tariff rate'),
+    ('tariff_rate_2', '2025-04-09', 'Second Trump tariff rate'),
+)
+
+def parse_rate(rate: str) -> float:
+    """Parse a tariff rate string like "34%" as a float"""
+    return float(rate.strip('%'))
+
+@lru_cache(maxsize=1)
+def load_trump_tariffs() -> Dict[int, List[TrumpTariffEntry]]:
+    """
+    Load Trump tariff data from cache as formatted entries, keyed by
+    country ID. The rates and commentary never change at runtime, so the
+    entries are built once here rather than on every request.
+    """
+    tariff_commentary = json_cache.get_tariff_commentary()
+    return {
+        item['id']: [
+            TrumpTariffEntry(
+                rate=parse_rate(item[key]),
+                date=tariff_commentary.get(key, {}).get('date', default_date),
+                description=tariff_commentary.get(key, {}).get('commentary', default_description)
+            )
+            for key, default_date, default_description in TRUMP_TARIFF_RATES
+            if item.get(key)
+        ]
+        for item in json_cache.get_trump_tariffs()
+    }
+
+def format_trump_tariffs(country_id: int) -> List[TrumpTariffEntry]:
+    """Get a country's Trump tariff rates with their commentary"""
+    # Already built by load_trump_tariffs (cached by @lru_cache)
+    return load_trump_tariffs().get(country_id, [])
+
+def format_country_details(
+    country: Dict[str, Any],
+    tariffs_on_us: Optional[TariffInfo],
+    us_tariffs: Optional[TariffInfo]
+) -> Country:
+    """Combine a country's reference data with its tariff data"""
+    return Country(
+        id=country['id'],
+        iso3_code=country['iso3_code'],
+        name=country['name'],
+        trade_region=country.get('trade_region'),
+        tariffs_on_us_imports=tariffs_on_us,
+        us_tariffs_on_imports=us_tariffs,
+        trump_tariffs=format_trump_tariffs(country['id'])
+    )
 
 @router.get("/countries", response_model=List[Country])
+# Long TTL (30 days) since country list rarely changes; browsers may keep it for a day
+@cached(ttl_seconds=86400 * 30, as_json=True, compress=True, max_age=86400, stale_seconds=86400)
 async def get_countries():
     """Get list of all countries"""
-    # Try to get from cache first
-    cache_key = "countries_list"
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return cached_data
-    
     try:
         # Load countries from reference data
-        countries = load_country_reference()
-        countries_list = list(countries.values())
-        
-        # Store in cache with a long TTL (30 days) since country list rarely changes
-        cache.set(cache_key, countries_list, ttl_seconds=86400 * 30)
-        
-        return countries_list
+        return [Country(**country) for country in load_country_reference().values()]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching countries: {str(e)}")
 
 @router.get("/country-mappings", response_model=Dict[str, str])
+# Long TTL (30 days) since mappings rarely change
+@cached(ttl_seconds=86400 * 30, as_json=True, max_age=86400)
 async def get_country_mappings(supabase=Depends(get_supabase)):
     """Get mappings between different ISO code variants"""
-    # Try to get from cache first
-    cache_key = "country_mappings"
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return cached_data
-    
     try:
         # Query the tbl_country_code_mapping table
-        response = supabase.table('tbl_country_code_mapping') \
-            .select('iso_alpha3, alternative_code, source') \
+        response = await supabase.table('tbl_country_code_mapping') \
+            .select('iso_alpha3, alternative_code') \
             .execute()
         
         # Create a mapping from alternative codes to standard ISO codes
         mappings = {}
         for item in response.data:
             mappings[item['alternative_code']] = item['iso_alpha3']
-        
-        # Store in cache with a long TTL (30 days) since mappings rarely change
-        cache.set(cache_key, mappings, ttl_seconds=86400 * 30)
-        
         return mappings
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching country mappings: {str(e)}")
 
+async def get_summary_series_cached(supabase, reporter_iso3: str, partner_iso3: str) -> List[Dict[str, Any]]:
+    """Get every year of trade summary for a country pair, querying only on a cache miss"""
+    async def fetch_series():
+        # Build the query using the view_trade_summary view. Filtering on the
+        # ISO3 columns lets Postgres push the filter into the view's yearly
+        # aggregation (and its index) instead of aggregating every pair
+        response = await supabase.table('view_trade_summary') \
+            .select('year, export_value_usd, import_value_usd, trade_deficit_usd') \
+            .eq('reporter_iso3', reporter_iso3) \
+            .eq('partner_iso3', partner_iso3) \
+            .order('year') \
+            .execute()
+        
+        return [
+            {
+                "year": item['year'],
+                "export": item['export_value_usd'],
+                "import_": item['import_value_usd'],
+                "trade_deficit": item['trade_deficit_usd']
+            }
+            for item in response.data
+        ]
+    
+    # Long TTL (7 days) since trade data rarely changes
+    return await cache.get_or_compute_async(
+        f"trade_summary_series:{reporter_iso3}:{partner_iso3}", fetch_series, ttl_seconds=86400 * 7
+    )
+
 @router.get("/summary", response_model=TradeSummaryResponse)
+# Long TTL (7 days) since trade data rarely changes; compressed since there's
+# an entry per country pair and year range
+@cached(ttl_seconds=86400 * 7, as_json=True, compress=True)
 async def get_trade_summary(
     reporter_id: int = Query(..., description="ID of the reporting country"),
     partner_id: int = Query(..., description="ID of the partner country"),
@@ -81,71 +157,72 @@ async def get_trade_summary(
     supabase=Depends(get_supabase)
 ):
     """Get trade summary between two countries"""
-    # Create a cache key based on the query parameters
-    cache_key = f"trade_summary:{reporter_id}:{partner_id}:{start_year}:{end_year}"
-    
-    # Try to get from cache first
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return cached_data
-    
     try:
-        # Build the query using the view_trade_summary view
-        query = supabase.table('view_trade_summary') \
-            .select('year, export_value_usd, import_value_usd, trade_deficit_usd') \
-            .eq('reporter_code', reporter_id) \
-            .eq('partner_code', partner_id)
-        
-        # Add year filters if provided
-        if start_year is not None:
-            query = query.gte('year', start_year)
-        if end_year is not None:
-            query = query.lte('year', end_year)
-            
-        # Execute the query
-        response = query.execute()
+        reporter_iso3 = get_iso3_by_id(reporter_id)
+        partner_iso3 = get_iso3_by_id(partner_id)
+        if not reporter_iso3 or not partner_iso3:
+            # No ISO3 code to filter on; answer as the view does for an unknown pair
+            return {
+                "reporter_id": reporter_id,
+                "partner_id": partner_id,
+                "summary": []
+            }
         
-        # Process the results
-        summary = []
-        for item in response.data:
-            summary.append({
-                "year": item['year'],
-                "export": item['export_value_usd'],
-                "import_": item['import_value_usd'],
-                "trade_deficit": item['trade_deficit_usd']
-            })
+        # Fetch the pair's full series once, so every year range is served
+        # from the same cached rows
+        summary = await get_summary_series_cached(supabase, reporter_iso3, partner_iso3)
         
-        # Sort by year
-        summary.sort(key=lambda x: x['year'])
+        # Apply the year filters if provided
+        if start_year is not None or end_year is not None:
+            summary = [
+                item for item in summary
+                if (start_year is None or item['year'] >= start_year)
+                and (end_year is None or item['year'] <= end_year)
+            ]
         
-        result = {
+        return {
             "reporter_id": reporter_id,
             "partner_id": partner_id,
             "summary": summary
         }
-        
-        # Store in cache with a long TTL (7 days) since trade data rarely changes
-        cache.set(cache_key, result, ttl_seconds=86400 * 7)
-        
-        return result
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Debug - Error occurred: {str(e)}")
+        logger.debug("Error occurred: %s", e)
         raise HTTPException(status_code=500, detail=f"Error fetching trade summary: {str(e)}")
 
-@router.post("/cache/clear")
+@router.post("/cache/clear", dependencies=[Depends(require_admin)])
 async def clear_cache():
     """Clear the cache (admin endpoint)"""
     try:
         cache.clear()
+        if redis_cache is not None:
+            await redis_cache.clear()
         return {"message": "Cache cleared successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing cache: {str(e)}")
 
+@router.post("/cache/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_cache(prefix: str = Query(..., min_length=1, description="Key prefix, e.g. get_trade_deficit_map")):
+    """
+    Delete the cached entries whose keys start with prefix (admin endpoint),
+    e.g. from the job that refreshes the data behind them
+    """
+    try:
+        result = {"deleted": cache.delete_prefix(prefix)}
+        if redis_cache is not None:
+            result["redis_deleted"] = await redis_cache.delete_prefix(prefix)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error invalidating cache: {str(e)}")
+
 @router.get("/cache/stats")
 async def get_cache_stats():
     """Get cache statistics (admin endpoint)"""
     try:
         stats = cache.get_stats()
+        if redis_cache is not None:
+            stats["redis"] = await redis_cache.get_stats()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting cache stats: {str(e)}")
@@ -155,99 +232,115 @@ async def get_cache_keys():
     """Get all cache keys (admin endpoint)"""
     try:
         keys = cache.get_keys()
+        if redis_cache is not None:
+            return {"keys": keys, "redis_keys": await redis_cache.get_keys()}
         return {"keys": keys}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting cache keys: {str(e)}")
 
+async def fetch_deficits(supabase, reporter_id: int, year: Optional[int]) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Get a reporting country's trade deficit rows for a year (defaults to the
+    latest available), as (year, rows)
+    """
+    # Get reporter ISO3 code
+    reporter_iso3 = get_iso3_by_id(reporter_id)
+    if not reporter_iso3:
+        raise HTTPException(status_code=400, detail="Invalid reporter country ID")
+    
+    if year is None:
+        # Get the latest year's deficits in one call; get_latest_deficits
+        # (see migrations/fn_get_latest_deficits.sql) finds the year itself
+        rpc = await supabase.rpc('get_latest_deficits', {'reporter': reporter_iso3})
+        response = await rpc.execute()
+        
+        if not response.data:
+            raise HTTPException(status_code=404, detail=f"No trade data available for country ID {reporter_id}")
+        
+        return response.data[0]['year'], response.data
+    
+    # Get trade deficits for the specified year, with partner code and
+    # name joined in by the materialized view
+    response = await supabase.table('mvw_trade_deficits_named') \
+        .select('partner_iso3, partner_code, partner_name, trade_balance_thousands') \
+        .eq('year', year) \
+        .eq('reporter_iso3', reporter_iso3) \
+        .not_.is_('partner_code', 'null') \
+        .execute()
+    
+    if not response.data:
+        raise HTTPException(status_code=404, detail=f"No trade data found for year {year}")
+    
+    return year, response.data
+
 @router.get("/deficit-map", response_model=TradeDeficitMapResponse)
+# Long TTL (7 days) since trade data rarely changes; once expired, the old map
+# is served for up to a day more while it's refreshed
+@cached(ttl_seconds=86400 * 7, as_json=True, compress=True, stale_seconds=86400)
 async def get_trade_deficit_map(
     reporter_id: int = Query(..., description="ID of the reporting country"),
     year: Optional[int] = Query(None, description="Year to get data for (defaults to latest available)"),
     supabase=Depends(get_supabase)
 ):
     """Get trade deficit data for all countries against a specific reporting country"""
-    # Create a cache key based on the parameters
-    cache_key = f"trade_deficit_map:{reporter_id}:{year if year else 'latest'}"
-    
-    # Try to get from cache first
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return cached_data
-    
     try:
-        # Get reporter ISO3 code
-        reporter_iso3 = get_iso3_by_id(reporter_id)
-        if not reporter_iso3:
-            raise HTTPException(status_code=400, detail="Invalid reporter country ID")
-        
-        # First, get the latest year if not specified
-        if year is None:
-            # Try to get the latest year from cache
-            latest_year_cache_key = f"latest_year:{reporter_iso3}"
-            cached_year = cache.get(latest_year_cache_key)
-            
-            if cached_year:
-                year = cached_year
-            else:
-                year_response = supabase.table('vw_trade_deficits') \
-                    .select('year') \
-                    .eq('reporter_iso3', reporter_iso3) \
-                    .order('year', desc=True) \
-                    .limit(1) \
-                    .execute()
-                
-                if not year_response.data:
-                    raise HTTPException(status_code=404, detail=f"No trade data available for country ID {reporter_id}")
-                
-                year = year_response.data[0]['year']
-                # Cache the latest year for 30 days
-                cache.set(latest_year_cache_key, year, ttl_seconds=86400 * 30)
+        year, rows = await fetch_deficits(supabase, reporter_id, year)
         
-        # Get trade deficits for the specified year
-        response = supabase.table('vw_trade_deficits') \
-            .select('partner_iso3, trade_balance_thousands') \
-            .eq('year', year) \
-            .eq('reporter_iso3', reporter_iso3) \
-            .execute()
-        
-        if not response.data:
-            raise HTTPException(status_code=404, detail=f"No trade data found for year {year}")
-        
-        # Load country reference data
-        countries = load_country_reference()
-        iso3_to_id = {country['iso3_code']: country['id'] for country in countries.values()}
-        
-        # Format the response
-        deficits = []
-        for item in response.data:
-            partner_iso3 = item['partner_iso3']
-            if partner_iso3 in iso3_to_id:
-                country_id = iso3_to_id[partner_iso3]
-                country_name = get_name_by_id(country_id)
-                
-                # Format country_id to match World-Atlas format (3-digit string with leading zeros)
-                formatted_id = f"{country_id:03d}"
-                
-                deficits.append(TradeDeficitEntry(
-                    country_id=formatted_id,  # Use formatted string ID
-                    country_code=partner_iso3,
-                    country_name=country_name,
-                    deficit_thousands=item['trade_balance_thousands']  # Remove the negation
-                ))
+        # Format the response as plain TradeDeficitEntry-shaped dicts; @cached
+        # serializes them straight to JSON, so model validation would only
+        # add per-row cost
+        deficits = [
+            {
+                "country_id": item['partner_code'],
+                "country_code": item['partner_iso3'],
+                "country_name": item['partner_name'],
+                "deficit_thousands": item['trade_balance_thousands']
+            }
+            for item in rows
+        ]
         
-        result = {
+        return {
             "year": year,
             "deficits": deficits
         }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching trade deficit map data: {str(e)}")
+
+@router.get("/deficit-map/compact", response_model=CompactDeficitMapResponse)
+# Same TTLs as /deficit-map
+@cached(ttl_seconds=86400 * 7, as_json=True, compress=True, stale_seconds=86400)
+async def get_compact_deficit_map(
+    reporter_id: int = Query(..., description="ID of the reporting country"),
+    year: Optional[int] = Query(None, description="Year to get data for (defaults to latest available)"),
+    supabase=Depends(get_supabase)
+):
+    """
+    Get the trade deficit map keyed by partner ISO3 code, each entry being
+    [3-digit country ID, country name, deficit in thousands USD]
+    """
+    try:
+        year, rows = await fetch_deficits(supabase, reporter_id, year)
         
-        # Store final result in cache with a long TTL (7 days)
-        cache.set(cache_key, result, ttl_seconds=86400 * 7)
-        
-        return result
+        return {
+            "year": year,
+            "deficits": {
+                item['partner_iso3']: [
+                    f"{item['partner_code']:03d}",
+                    item['partner_name'],
+                    item['trade_balance_thousands']
+                ]
+                for item in rows
+            }
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching trade deficit map data: {str(e)}")
 
 @router.get("/country-details/{country_id}", response_model=Country)
+@cached(ttl_seconds=86400, as_json=True)  # Shorter TTL (1 day) since WTO data might update
 async def get_country_details(
     country_id: str,  # Accept string to handle both "004" and 4 formats
     supabase=Depends(get_supabase)
@@ -260,116 +353,105 @@ async def get_country_details(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid country ID format. Must be a numeric value.")
 
-        # Try to get from cache first
-        cache_key = f"country_details:{country_id}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
-
         # Get country reference data (already cached by @lru_cache)
         countries = load_country_reference()
         country = countries.get(numeric_id)
         if not country:
             raise HTTPException(status_code=404, detail="Country not found")
 
-        # Get Trump tariff data (now cached)
-        trump_tariffs = load_trump_tariffs()
-        trump_tariff_data = next(
-            (item for item in trump_tariffs if item['id'] == numeric_id),
-            None
-        )
-
-        # Format Trump tariff data
-        trump_tariff_entries = []
-        if trump_tariff_data:
-            # Get tariff commentary from cache
-            tariff_commentary = json_cache.get_tariff_commentary()
-            
-            if trump_tariff_data.get('tariff_rate_1'):
-                rate_1_commentary = tariff_commentary.get('tariff_rate_1', {})
-                trump_tariff_entries.append(TrumpTariffEntry(
-                    rate=float(trump_tariff_data['tariff_rate_1'].strip('%')),
-                    date=rate_1_commentary.get('date', '2025-04-02'),
-                    description=rate_1_commentary.get('commentary', 'First Trump tariff rate')
-                ))
-            if trump_tariff_data.get('tariff_rate_2'):
-                rate_2_commentary = tariff_commentary.get('tariff_rate_2', {})
-                trump_tariff_entries.append(TrumpTariffEntry(
-                    rate=float(trump_tariff_data['tariff_rate_2'].strip('%')),
-                    date=rate_2_commentary.get('date', '2025-04-09'),
-                    description=rate_2_commentary.get('commentary', 'Second Trump tariff rate')
-                ))
-
-        # Get WTO tariff data
-        tariff_query = (
+        # Get WTO tariff data in both directions (country -> US and US -> country)
+        # with one query, newest year first
+        tariff_response = await (
             supabase.table('view_tariff_summary')
-            .select('year, tariff_type, simple_average, weighted_average')
-            .eq('reporter_code', numeric_id)
-            .eq('partner_code', 840)  # US code
-            .eq('tariff_type', 'AHS')
+            .select('reporter_code, partner_code, year, simple_average, weighted_average')
+            .in_('reporter_code', [numeric_id, 840])  # 840 is US code
+            .in_('partner_code', [840, numeric_id])
+            .eq('tariff_type', DETAILS_TARIFF_TYPE)
             .order('year', desc=True)
-            .limit(1)
+            .execute()
         )
         
-        tariff_response = tariff_query.execute()
+        # Keep the newest row for each direction; the IN filters can also
+        # match a country's tariffs on itself, which are skipped
         tariffs_on_us = None
-        if tariff_response.data:
-            tariff_data = tariff_response.data[0]
-            tariffs_on_us = TariffInfo(
-                year=tariff_data['year'],
-                tariff_type=tariff_data['tariff_type'],
-                simple_average=tariff_data['simple_average'],
-                weighted_average=tariff_data['weighted_average']
-            )
-
-        # Then, get tariffs imposed by US on the country's imports
-        us_tariff_query = (
-            supabase.table('view_tariff_summary')
-            .select('year, tariff_type, simple_average, weighted_average')
-            .eq('reporter_code', 840)  # US code
-            .eq('partner_code', numeric_id)
-            .eq('tariff_type', 'AHS')
-            .order('year', desc=True)
-            .limit(1)
-        )
-        
-        us_tariff_response = us_tariff_query.execute()
         us_tariffs = None
-        if us_tariff_response.data:
-            tariff_data = us_tariff_response.data[0]
-            us_tariffs = TariffInfo(
-                year=tariff_data['year'],
-                tariff_type=tariff_data['tariff_type'],
-                simple_average=tariff_data['simple_average'],
-                weighted_average=tariff_data['weighted_average']
-            )
+        for tariff_data in tariff_response.data:
+            pair = (tariff_data['reporter_code'], tariff_data['partner_code'])
+            if pair == (numeric_id, 840) and tariffs_on_us is None:
+                tariffs_on_us = format_tariff_info(tariff_data)
+            if pair == (840, numeric_id) and us_tariffs is None:
+                us_tariffs = format_tariff_info(tariff_data)
+
+        return format_country_details(country, tariffs_on_us, us_tariffs)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching country details: {str(e)}")
 
-        # Combine all data
-        result = Country(
-            id=country['id'],
-            iso3_code=country['iso3_code'],
-            name=country['name'],
-            trade_region=country.get('trade_region'),
-            tariffs_on_us_imports=tariffs_on_us,
-            us_tariffs_on_imports=us_tariffs,
-            trump_tariffs=trump_tariff_entries
+@router.post("/country-details", response_model=List[Country])
+async def get_country_details_batch(
+    country_ids: List[int],
+    supabase: AsyncPostgrestClient = Depends(get_supabase)
+):
+    """
+    Get detailed information about several countries, with one query per
+    tariff direction instead of one request per country
+    """
+    try:
+        # Get country reference data (already cached by @lru_cache)
+        countries = load_country_reference()
+        for country_id in country_ids:
+            if country_id not in countries:
+                raise HTTPException(status_code=404, detail=f"Country {country_id} not found")
+        
+        if not country_ids:
+            return []
+        
+        # Get WTO tariff data in both directions for every country at once,
+        # newest year first
+        def tariff_query(reporter_codes: List[int], partner_codes: List[int]):
+            return supabase.table('view_tariff_summary') \
+                .select('reporter_code, partner_code, year, simple_average, weighted_average') \
+                .in_('reporter_code', reporter_codes) \
+                .in_('partner_code', partner_codes) \
+                .eq('tariff_type', DETAILS_TARIFF_TYPE) \
+                .order('year', desc=True) \
+                .execute()
+        
+        codes = sorted(set(country_ids))
+        on_us_response, us_response = await asyncio.gather(
+            tariff_query(codes, [840]),  # 840 is US code
+            tariff_query([840], codes)
         )
         
-        # Cache the final result with a shorter TTL (1 day) since WTO data might update
-        cache.set(cache_key, result, ttl_seconds=86400)
+        # Keep the newest row for each country
+        tariffs_on_us: Dict[int, TariffInfo] = {}
+        for tariff_data in on_us_response.data:
+            if tariff_data['reporter_code'] not in tariffs_on_us:
+                tariffs_on_us[tariff_data['reporter_code']] = format_tariff_info(tariff_data)
+        us_tariffs: Dict[int, TariffInfo] = {}
+        for tariff_data in us_response.data:
+            if tariff_data['partner_code'] not in us_tariffs:
+                us_tariffs[tariff_data['partner_code']] = format_tariff_info(tariff_data)
         
-        return result
+        return [
+            format_country_details(countries[country_id], tariffs_on_us.get(country_id), us_tariffs.get(country_id))
+            for country_id in country_ids
+        ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching country details: {str(e)}")
 
 @router.get("/deficit-rankings")
-async def get_deficit_rankings(supabase: Client = Depends(get_supabase)):
+@cached(ttl_seconds=86400 * 7, as_json=True)  # Long TTL (7 days) since trade data rarely changes
+async def get_deficit_rankings(supabase: AsyncPostgrestClient = Depends(get_supabase)):
     """
     Get top 5 countries with highest trade deficit with US
     """
     try:
         # Get top 5 countries by trade deficit with US
-        deficit_query = (
+        deficit_query = await (
             supabase.table('view_trade_summary')
             .select('partner_code, partner_name, partner_iso3, export_value_usd, import_value_usd, trade_deficit_usd')
             .eq('reporter_code', 840)  # US code
@@ -399,6 +481,8 @@ async def get_deficit_rankings(supabase: Client = Depends(get_supabase)):
         raise HTTPException(status_code=500, detail=f"Error fetching deficit rankings: {str(e)}")
 
 @router.get("/trump-tariff-timeline")
+# Built from the bundled commentary JSON, so it only changes on deploy
+@cached(ttl_seconds=86400 * 30, as_json=True, max_age=86400)
 async def get_trump_tariff_timeline():
     """
     Get the timeline of Trump-era tariff announcements
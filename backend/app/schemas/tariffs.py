@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+class CountryPair(BaseModel):
+    imposing_country_id: int
+    target_country_id: int
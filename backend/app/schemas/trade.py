@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 class TariffInfo(BaseModel):
     year: int
@@ -40,4 +40,9 @@ class TradeDeficitEntry(BaseModel):
 
 class TradeDeficitMapResponse(BaseModel):
     year: int
-    deficits: List[TradeDeficitEntry] 
\ No newline at end of file
+    deficits: List[TradeDeficitEntry] 
+
+class CompactDeficitMapResponse(BaseModel):
+    year: int
+    # Partner ISO3 code -> (3-digit country ID, country name, deficit in thousands USD)
+    deficits: Dict[str, Tuple[str, str, float]]
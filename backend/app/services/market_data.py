@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 import yfinance as yf
 from fastapi import HTTPException
-from ..cache import get_cache, set_cache
+from ..cache import cache
 import time
 import random
 
@@ -11,11 +11,11 @@ MAX_RETRIES = 3
 INITIAL_RETRY_DELAY = 1  # seconds
 
 def get_market_data():
-    # Try to get cached data first
-    cached_data = get_cache(CACHE_KEY)
-    if cached_data:
-        return cached_data
+    # Concurrent requests missing the cache wait for one Yahoo Finance fetch
+    # instead of each starting their own
+    return cache.get_or_compute(CACHE_KEY, fetch_market_data, CACHE_TTL)
 
+def fetch_market_data():
     try:
         # Fetch data from Yahoo Finance
         symbols = {
@@ -27,72 +27,78 @@ def get_market_data():
             "XLI": "Industrial Sector ETF"
         }
         
+        # Fetch 90 days of daily history for all symbols in one batched
+        # download, instead of two requests per symbol
+        end_date = datetime.now()
+        start_date_90d = end_date - timedelta(days=90)
+        
+        retry_count = 0
+        while True:
+            try:
+                hist = yf.download(
+                    list(symbols),
+                    start=start_date_90d,
+                    end=end_date,
+                    group_by="ticker",
+                    threads=True,
+                    progress=False
+                )
+                if hist.empty:
+                    raise ValueError("No data returned")
+                break  # Success, exit retry loop
+            except Exception as e:
+                retry_count += 1
+                if retry_count == MAX_RETRIES:
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Error fetching market data after {MAX_RETRIES} retries: {str(e)}"
+                    )
+                # Exponential backoff with jitter
+                delay = INITIAL_RETRY_DELAY * (2 ** (retry_count - 1)) + random.uniform(0, 1)
+                time.sleep(delay)
+        
         data = {}
         for symbol, name in symbols.items():
-            retry_count = 0
-            while retry_count < MAX_RETRIES:
-                try:
-                    ticker = yf.Ticker(symbol)
-                    
-                    # Get current price and daily change
-                    info = ticker.info
-                    current_price = info.get('regularMarketPrice', 0)
-                    previous_close = info.get('regularMarketPreviousClose', 0)
-                    daily_change = current_price - previous_close
-                    daily_change_percent = (daily_change / previous_close) * 100 if previous_close else 0
-                    
-                    # Get historical data for 90 days
-                    end_date = datetime.now()
-                    start_date_90d = end_date - timedelta(days=90)
-                    start_date_30d = end_date - timedelta(days=30)
-                    
-                    # Fetch 90 days of data
-                    hist = ticker.history(start=start_date_90d, end=end_date)
-                    
-                    if not hist.empty:
-                        # Get reference prices
-                        price_90d_ago = hist['Close'].iloc[0]
-                        price_30d_ago = hist['Close'].iloc[-30] if len(hist) >= 30 else price_90d_ago
-                        
-                        # Calculate changes
-                        change_90d = current_price - price_90d_ago
-                        change_90d_percent = (change_90d / price_90d_ago) * 100 if price_90d_ago else 0
-                        
-                        change_30d = current_price - price_30d_ago
-                        change_30d_percent = (change_30d / price_30d_ago) * 100 if price_30d_ago else 0
-                    else:
-                        price_90d_ago = 0
-                        price_30d_ago = 0
-                        change_90d = 0
-                        change_90d_percent = 0
-                        change_30d = 0
-                        change_30d_percent = 0
-                    
-                    data[symbol] = {
-                        "name": name,
-                        "price": round(current_price, 2),
-                        "daily_change": round(daily_change, 2),
-                        "daily_change_percent": round(daily_change_percent, 2),
-                        "change_30d": round(change_30d, 2),
-                        "change_30d_percent": round(change_30d_percent, 2),
-                        "change_90d": round(change_90d, 2),
-                        "change_90d_percent": round(change_90d_percent, 2),
-                        "last_updated": datetime.now().isoformat()
-                    }
-                    break  # Success, exit retry loop
-                except Exception as e:
-                    retry_count += 1
-                    if retry_count == MAX_RETRIES:
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Error fetching market data for {symbol} after {MAX_RETRIES} retries: {str(e)}"
-                        )
-                    # Exponential backoff with jitter
-                    delay = INITIAL_RETRY_DELAY * (2 ** (retry_count - 1)) + random.uniform(0, 1)
-                    time.sleep(delay)
+            close = hist[symbol]["Close"].dropna()
+            
+            if len(close) >= 2:
+                # Get current price and daily change from the last two closes
+                current_price = float(close.iloc[-1])
+                previous_close = float(close.iloc[-2])
+                daily_change = current_price - previous_close
+                daily_change_percent = (daily_change / previous_close) * 100 if previous_close else 0
+                
+                # Get reference prices
+                price_90d_ago = float(close.iloc[0])
+                price_30d_ago = float(close.iloc[-30]) if len(close) >= 30 else price_90d_ago
+                
+                # Calculate changes
+                change_90d = current_price - price_90d_ago
+                change_90d_percent = (change_90d / price_90d_ago) * 100 if price_90d_ago else 0
+                
+                change_30d = current_price - price_30d_ago
+                change_30d_percent = (change_30d / price_30d_ago) * 100 if price_30d_ago else 0
+            else:
+                current_price = float(close.iloc[-1]) if len(close) else 0
+                daily_change = 0
+                daily_change_percent = 0
+                change_90d = 0
+                change_90d_percent = 0
+                change_30d = 0
+                change_30d_percent = 0
+            
+            data[symbol] = {
+                "name": name,
+                "price": round(current_price, 2),
+                "daily_change": round(daily_change, 2),
+                "daily_change_percent": round(daily_change_percent, 2),
+                "change_30d": round(change_30d, 2),
+                "change_30d_percent": round(change_30d_percent, 2),
+                "change_90d": round(change_90d, 2),
+                "change_90d_percent": round(change_90d_percent, 2),
+                "last_updated": datetime.now().isoformat()
+            }
         
-        # Cache the data
-        set_cache(CACHE_KEY, data, CACHE_TTL)
         return data
         
     except Exception as e:
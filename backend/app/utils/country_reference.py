@@ -1,6 +1,4 @@
-import json
-from pathlib import Path
-from typing import Dict, Optional, TypedDict, Any
+from typing import Dict, Optional, Tuple, TypedDict
 from functools import lru_cache
 from ..utils.json_cache import json_cache
 
@@ -17,22 +15,51 @@ def load_country_reference() -> Dict[int, CountryData]:
     # Convert list to dictionary with id as key
     return {country['id']: country for country in data}
 
+@lru_cache(maxsize=1)
+def get_iso3_to_id() -> Dict[str, int]:
+    """Get a mapping from ISO3 code to country ID, built once"""
+    return {country['iso3_code']: country['id'] for country in load_country_reference().values()}
+
+@lru_cache(maxsize=1024)
+def get_map_fields_by_iso3(iso3_code: str) -> Tuple[Optional[str], bool]:
+    """
+    Get (World-Atlas country ID, is_region) for a tariff partner code.
+    The ID is a 3-digit string, or None if the code isn't a known country.
+    """
+    country_id = get_iso3_to_id().get(iso3_code)
+    return (
+        f"{country_id:03d}" if country_id is not None else None,
+        len(iso3_code) == 3 and iso3_code.endswith('U')  # Simple check for region codes like EUU
+    )
+
 def get_country_by_id(country_id: int) -> Optional[CountryData]:
     """Get country data by ID"""
     countries = load_country_reference()
     return countries.get(country_id)
 
+@lru_cache(maxsize=1)
+def get_id_to_iso3() -> Dict[int, str]:
+    """Get a mapping from country ID to ISO3 code, built once"""
+    return {country['id']: country['iso3_code'] for country in load_country_reference().values()}
+
+@lru_cache(maxsize=1)
+def get_id_to_name() -> Dict[int, str]:
+    """Get a mapping from country ID to name, built once"""
+    return {country['id']: country['name'] for country in load_country_reference().values()}
+
+@lru_cache(maxsize=1)
+def get_id_to_trade_region() -> Dict[int, Optional[str]]:
+    """Get a mapping from country ID to trade region, built once"""
+    return {country['id']: country['trade_region'] for country in load_country_reference().values()}
+
 def get_iso3_by_id(country_id: int) -> Optional[str]:
     """Get ISO3 code by country ID"""
-    country = get_country_by_id(country_id)
-    return country['iso3_code'] if country else None
+    return get_id_to_iso3().get(country_id)
 
 def get_name_by_id(country_id: int) -> Optional[str]:
     """Get country name by ID"""
-    country = get_country_by_id(country_id)
-    return country['name'] if country else None
+    return get_id_to_name().get(country_id)
 
 def get_trade_region_by_id(country_id: int) -> Optional[str]:
     """Get trade region by country ID"""
-    country = get_country_by_id(country_id)
-    return country['trade_region'] if country else None 
\ No newline at end of file
+    return get_id_to_trade_region().get(country_id)
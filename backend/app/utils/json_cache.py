@@ -1,7 +1,6 @@
 from pathlib import Path
-import json
 from typing import Dict, Any, List
-from functools import lru_cache
+import orjson
 
 class JSONCache:
     _instance = None
@@ -31,8 +30,7 @@ class JSONCache:
             file_path = data_dir / file_name
             if file_path.exists():
                 try:
-                    with open(file_path, 'r') as f:
-                        self._data[file_name] = json.load(f)
+                    self._data[file_name] = orjson.loads(file_path.read_bytes())
                 except Exception as e:
                     print(f"Error loading {file_name}: {str(e)}")
 
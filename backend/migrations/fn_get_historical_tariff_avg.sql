@@ -0,0 +1,28 @@
+create or replace function public.get_historical_tariff_avg(
+  country text,
+  partner text default null,
+  start_year integer default null,
+  end_year integer default null
+) returns table (year integer, avg_tariff numeric)
+language sql stable as $$
+select
+  extract(year from tr.tariff_date)::integer as year,
+  avg(tr.avg_tariff) as avg_tariff
+from
+  tbl_tariff_rates tr
+where
+  tr.involved_iso3 @> array[country]
+  and (
+    partner is null
+    or tr.imposing_iso3 = partner
+    or tr.target_iso3 = partner
+  )
+  and (start_year is null or tr.tariff_date >= make_date(start_year, 1, 1))
+  and (end_year is null or tr.tariff_date <= make_date(end_year, 12, 31))
+group by
+  1
+having
+  count(tr.avg_tariff) > 0
+order by
+  1;
+$$;
@@ -0,0 +1,31 @@
+create or replace function public.get_latest_deficits(reporter text)
+returns table (
+  year integer,
+  partner_iso3 text,
+  partner_code smallint,
+  partner_name text,
+  trade_balance_thousands numeric
+)
+language sql stable as $$
+with
+  latest as (
+    select
+      max(d.year) as year
+    from
+      mvw_trade_deficits_named d
+    where
+      d.reporter_iso3 = reporter
+  )
+select
+  d.year::integer,
+  d.partner_iso3::text,
+  d.partner_code,
+  d.partner_name::text,
+  d.trade_balance_thousands::numeric
+from
+  mvw_trade_deficits_named d
+  join latest l on d.year = l.year
+where
+  d.reporter_iso3 = reporter
+  and d.partner_code is not null;
+$$;
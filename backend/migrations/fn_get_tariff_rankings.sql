@@ -0,0 +1,66 @@
+create or replace function public.get_tariff_rankings(reporter text, yr integer, n integer)
+returns table (
+  partner_code smallint,
+  partner_name text,
+  partner_iso3 text,
+  total_trade numeric,
+  tariff_on_us numeric,
+  reporter_tariff numeric
+)
+language sql stable as $$
+with
+  top_partners as (
+    select
+      t.reporter_code,
+      t.partner_code,
+      t.partner_name,
+      t.partner_iso3,
+      t.export_value_usd,
+      t.import_value_usd
+    from
+      view_trade_summary t
+    where
+      t.reporter_iso3 = reporter
+      and t.partner_code <> 0
+      and t.year = yr
+    order by
+      t.export_value_usd desc
+    limit
+      n
+  )
+select
+  tp.partner_code,
+  tp.partner_name::text,
+  tp.partner_iso3::text,
+  (tp.export_value_usd + tp.import_value_usd)::numeric as total_trade,
+  (
+    select
+      tr.simple_average
+    from
+      tbl_tariff_rates tr
+    where
+      tr.reporter_code = tp.partner_code
+      and tr.partner_code = tp.reporter_code
+      and tr.tariff_type = 'AHS'
+      and tr.year = yr
+    limit
+      1
+  )::numeric as tariff_on_us,
+  (
+    select
+      tr.simple_average
+    from
+      tbl_tariff_rates tr
+    where
+      tr.reporter_code = tp.reporter_code
+      and tr.partner_code = tp.partner_code
+      and tr.tariff_type = 'AHS'
+      and tr.year = yr
+    limit
+      1
+  )::numeric as reporter_tariff
+from
+  top_partners tp
+order by
+  total_trade desc;
+$$;
@@ -0,0 +1,6 @@
+-- Serves /api/tariffs/highest/{year}: the year's rows are found with a
+-- range scan on tariff_date, and the included columns are the others the
+-- endpoint selects, so it's an index-only scan with no heap lookups
+create index if not exists idx_tariff_rates_date on public.tbl_tariff_rates using btree (
+  tariff_date
+) include (imposing_iso3, target_iso3, avg_tariff, product_group) TABLESPACE pg_default;
@@ -0,0 +1,7 @@
+-- Serves view_trade_summary lookups for one reporter/partner pair: the
+-- view's per-year aggregation only reads that pair's rows
+create index if not exists idx_trade_transactions_pair_year on public.tbl_trade_transactions using btree (
+  reporter_iso3,
+  partner_iso3,
+  year
+) TABLESPACE pg_default;
@@ -0,0 +1,29 @@
+-- Trade deficits with the partner's country code and name already joined in,
+-- read by /api/trade/deficit-map. Materialized so the aggregation behind
+-- vw_trade_deficits isn't recomputed per request; refreshed nightly below.
+create materialized view public.mvw_trade_deficits_named as
+select
+  d.year,
+  d.reporter_iso3,
+  d.partner_iso3,
+  p.code as partner_code,
+  p.name as partner_name,
+  d.trade_balance_thousands
+from
+  vw_trade_deficits d
+  left join tbl_country_codes p on d.partner_iso3 = p.iso_alpha3::text;
+
+-- Required by refresh ... concurrently
+create unique index idx_mvw_trade_deficits_named_key on public.mvw_trade_deficits_named using btree (
+  reporter_iso3,
+  year,
+  partner_iso3
+) TABLESPACE pg_default;
+
+-- Nightly refresh (needs the pg_cron extension)
+select
+  cron.schedule(
+    'refresh-mvw-trade-deficits-named',
+    '0 3 * * *',
+    $$refresh materialized view concurrently public.mvw_trade_deficits_named$$
+  );
@@ -0,0 +1,7 @@
+-- Both countries of a tariff in one column, so "tariffs imposed by or on X"
+-- is a single GIN index probe (involved_iso3 @> array['X']) rather than a
+-- BitmapOr over separate imposing_iso3 and target_iso3 scans.
+alter table public.tbl_tariff_rates
+add column if not exists involved_iso3 text[] generated always as (array[imposing_iso3, target_iso3]) stored;
+
+create index if not exists idx_tariff_rates_involved_iso3 on public.tbl_tariff_rates using gin (involved_iso3) TABLESPACE pg_default;
@@ -1,38 +1,75 @@
 import csv
-import json
 import argparse
+import orjson
 
-def process_tariff_file(input_file: str, output_file: str):
-    result = []
+def read_tariff_entries(input_file: str):
+    """Yield the 2023 AHS entries of a WITS tariff CSV, one at a time"""
+    with open(input_file, mode="r", encoding="ISO-8859-1") as f:
+        reader = csv.reader(f, delimiter=",")
 
+        # Look up the column positions once; the rows are plain lists
+        header = next(reader)
+        i_reporter = header.index("Reporter")
+        i_partner = header.index("Partner")
+        i_year = header.index("Tariff Year")
+        i_duty_type = header.index("DutyType")
+        i_simple_avg = header.index("Simple Average")
+        i_weighted_avg = header.index("Weighted Average")
+        i_max = header.index("Maximum Rate")
+        i_lines = header.index("Nbr of Total Lines")
+        i_domestic_peaks = header.index("Nbr of DomesticPeaks")
+        i_international_peaks = header.index("Nbr of InternationalPeaks")
+        i_imports = header.index("Imports Value in 1000 USD")
+        # Rows shorter than this (blank lines, footers) lack some of the columns
+        min_row_length = max(
+            i_reporter, i_partner, i_year, i_duty_type, i_simple_avg, i_weighted_avg,
+            i_max, i_lines, i_domestic_peaks, i_international_peaks, i_imports
+        ) + 1
+
+        # Only lines mentioning 2023 can be 2023 records, so skip the rest
+        # before they're split into fields. This filters physical lines, so it
+        # assumes one record per line: WITS exports have no quoted newlines, and
+        # a multi-line record would be split apart here.
+        for row in csv.reader((line for line in f if "2023" in line), delimiter=","):
+            if len(row) < min_row_length:
+                continue
+            if row[i_year] == "2023" and row[i_duty_type].strip().upper() == "AHS":
+                try:
+                    entry = {
+                        "reporter_id": int(row[i_reporter]),
+                        "partner_id": int(row[i_partner]),
+                        "year": int(row[i_year]),
+                        "simple_avg_tariff": float(row[i_simple_avg]),
+                        "weighted_avg_tariff": float(row[i_weighted_avg]),
+                        "max_tariff": float(row[i_max]),
+                        "num_tariff_lines": int(row[i_lines]),
+                        "domestic_peaks": int(row[i_domestic_peaks]),
+                        "international_peaks": int(row[i_international_peaks]),
+                        "import_value_usd": float(row[i_imports]) * 1000
+                    }
+                except Exception as e:
+                    print(f"⚠️ Skipping row due to parse error: {e}")
+                    continue
+                yield entry
+
+def process_tariff_file(input_file: str, output_file: str, ndjson: bool = False):
     try:
-        with open(input_file, mode="r", encoding="ISO-8859-1") as f:
-            reader = csv.DictReader(f, delimiter=",")
-
-            for row in reader:
-                print(f"Processing row: {row}")  # Debugging line to see the current row being processed
-                if row["Tariff Year"] == "2023" and row["DutyType"].strip().upper() == "AHS":
-                    try:
-                        entry = {
-                            "reporter_id": int(row["Reporter"]),
-                            "partner_id": int(row["Partner"]),
-                            "year": int(row["Tariff Year"]),
-                            "simple_avg_tariff": float(row["Simple Average"]),
-                            "weighted_avg_tariff": float(row["Weighted Average"]),
-                            "max_tariff": float(row["Maximum Rate"]),
-                            "num_tariff_lines": int(row["Nbr of Total Lines"]),
-                            "domestic_peaks": int(row["Nbr of DomesticPeaks"]),
-                            "international_peaks": int(row["Nbr of InternationalPeaks"]),
-                            "import_value_usd": float(row["Imports Value in 1000 USD"]) * 1000
-                        }
-                        result.append(entry)
-                    except Exception as e:
-                        print(f"⚠️ Skipping row due to parse error: {e}")
-
-        with open(output_file, "w", encoding="utf-8") as out:
-            json.dump(result, out, indent=2)
-
-        print(f"✅ Success: {len(result)} entries saved to {output_file}")
+        if ndjson:
+            # One record per line, written as it's parsed, so memory stays
+            # flat however large the extract is
+            count = 0
+            with open(output_file, "wb") as out:
+                for entry in read_tariff_entries(input_file):
+                    out.write(orjson.dumps(entry))
+                    out.write(b"\n")
+                    count += 1
+        else:
+            result = list(read_tariff_entries(input_file))
+            with open(output_file, "wb") as out:
+                out.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+            count = len(result)
+
+        print(f"✅ Success: {count} entries saved to {output_file}")
 
     except Exception as e:
         print(f"❌ Failed to read or process the file: {e}")
@@ -41,6 +78,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process WITS tariff CSV to JSON")
     parser.add_argument("input_file", help="Input tab-separated WITS CSV file")
     parser.add_argument("output_file", help="Output JSON file path")
+    parser.add_argument("--ndjson", action="store_true", help="Write one JSON record per line instead of an indented array")
     args = parser.parse_args()
 
-    process_tariff_file(args.input_file, args.output_file)
+    process_tariff_file(args.input_file, args.output_file, ndjson=args.ndjson)
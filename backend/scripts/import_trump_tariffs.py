@@ -208,6 +208,28 @@ COUNTRY_TO_ISO3 = {
     'Reunion': 'REU'
 }
 
+# Rows per insert request
+BATCH_SIZE = 500
+
+def insert_rows(rows):
+    """
+    Insert rows into tbl_trump_tariff in batches of BATCH_SIZE. If a batch
+    fails, its rows are inserted one by one to find the offending ones.
+    """
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        try:
+            supabase.table('tbl_trump_tariff').insert(batch).execute()
+            print(f"Successfully inserted {len(batch)} rows")
+        except Exception as e:
+            print(f"Error inserting batch, retrying row by row: {e}")
+            for data in batch:
+                try:
+                    supabase.table('tbl_trump_tariff').insert(data).execute()
+                    print(f"Successfully inserted data for {data['partner_name']}")
+                except Exception as e:
+                    print(f"Error inserting data for {data['partner_name']}: {e}")
+
 def import_trump_tariffs(csv_file_path):
     """
     Import Trump tariff data from CSV file into the tbl_trump_tariff table.
@@ -215,24 +237,14 @@ def import_trump_tariffs(csv_file_path):
     try:
         # Read the CSV file with utf-8-sig encoding to handle BOM
         with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
-            # Print the first few lines of the file for debugging
-            print("First few lines of the CSV file:")
-            for i, line in enumerate(file):
-                if i < 5:  # Print first 5 lines
-                    print(line.strip())
-                else:
-                    break
-            
-            # Reset file pointer to beginning
-            file.seek(0)
-            
             # Read the CSV file
             csv_reader = csv.DictReader(file)
             
             # Print the column names for debugging
-            print("\nCSV columns:", csv_reader.fieldnames)
+            print("CSV columns:", csv_reader.fieldnames)
             
-            # Process each row
+            # Process each row, collecting the rows to insert
+            rows = []
             for row in csv_reader:
                 try:
                     partner_name = row['partner_name']
@@ -246,23 +258,14 @@ def import_trump_tariffs(csv_file_path):
                         print(f"Warning: No ISO3 code found for {partner_name}")
                         continue
                     
-                    # Insert data into the table
-                    data = {
+                    rows.append({
                         'partner_iso3': partner_iso3,
                         'partner_name': partner_name,
                         'trump_claimed_tariff': trump_claimed_tariff,
                         'wto_reported_tariff': trump_claimed_tariff,  # Same as trump_claimed_tariff as requested
                         'us_reciprocal_tariff': us_reciprocal_tariff,
                         'source': 'CSV Import'
-                    }
-                    
-                    # Insert the data into the table
-                    result = supabase.table('tbl_trump_tariff').insert(data).execute()
-                    
-                    if hasattr(result, 'error') and result.error:
-                        print(f"Error inserting data for {partner_name}: {result.error}")
-                    else:
-                        print(f"Successfully inserted data for {partner_name}")
+                    })
                 except KeyError as e:
                     print(f"Error: Missing column in CSV: {e}")
                     print("Available columns:", row.keys())
@@ -276,6 +279,9 @@ def import_trump_tariffs(csv_file_path):
                     print("Row data:", row)
                     raise
         
+        # Insert the data into the table
+        insert_rows(rows)
+        
         print("Import completed successfully")
     
     except Exception as e:
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import cache as cache_module
+from app.cache import Cache, cached
+
+
+@pytest.fixture(autouse=True)
+def in_process_only(monkeypatch):
+    # Keep the tests off any Redis configured in the environment
+    monkeypatch.setattr(cache_module, "redis_cache", None)
+    cache_module.cache.clear()
+    yield
+    cache_module.cache.clear()
+
+
+def test_concurrent_misses_compute_once():
+    c = Cache()
+    calls = 0
+
+    async def producer():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(c.get_or_compute_async("key", producer) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["value"] * 10
+    assert calls == 1
+    assert c.get("key") == "value"
+
+
+def test_first_caller_cancelled_others_still_get_value():
+    c = Cache()
+
+    async def producer():
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        first = asyncio.create_task(c.get_or_compute_async("key", producer))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(c.get_or_compute_async("key", producer))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first
+
+    value, first = asyncio.run(main())
+    assert value == "value"
+    assert first.cancelled()
+    assert c.get("key") == "value"
+
+
+def test_exception_reaches_every_waiter_and_is_not_cached():
+    c = Cache()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(
+            *(c.get_or_compute_async("key", failing) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert c.get("key") is None
+
+    async def succeeding():
+        return "value"
+
+    # The failure isn't cached, so the next call runs the producer again
+    assert asyncio.run(c.get_or_compute_async("key", succeeding)) == "value"
+
+
+def test_stale_value_served_while_refresh_runs():
+    c = Cache()
+    # Zero TTL: the entry is stale at once, but kept for stale_seconds
+    c.set("key", "old", ttl_seconds=0, stale_seconds=60)
+
+    async def main():
+        release = asyncio.Event()
+        calls = 0
+
+        async def producer():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "new"
+
+        # Both calls get the stale value while one refresh is in flight
+        assert await c.get_or_compute_async("key", producer, ttl_seconds=60, stale_seconds=60) == "old"
+        assert await c.get_or_compute_async("key", producer, ttl_seconds=60, stale_seconds=60) == "old"
+        release.set()
+        await asyncio.gather(*c._refresh_tasks)
+        assert calls == 1
+        assert await c.get_or_compute_async("key", producer) == "new"
+
+    asyncio.run(main())
+
+
+def test_cached_rejects_sync_functions():
+    with pytest.raises(TypeError):
+        cached()(lambda: None)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/items")
+    @cached(ttl_seconds=60, as_json=True, compress=True)
+    async def get_items():
+        app.state.calls += 1
+        return {"items": [1, 2, 3]}
+
+    return TestClient(app)
+
+
+def test_cached_json_round_trips_through_compression(client):
+    first = client.get("/items")
+    second = client.get("/items")
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json() == {"items": [1, 2, 3]}
+    assert first.headers["etag"] == second.headers["etag"]
+    assert client.app.state.calls == 1
+
+
+def test_etag_match_returns_304(client):
+    etag = client.get("/items").headers["etag"]
+
+    response = client.get("/items", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get("/items", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.json() == {"items": [1, 2, 3]}
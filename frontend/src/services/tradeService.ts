@@ -95,6 +95,11 @@ export interface DeficitMapResponse {
   deficits: DeficitMapItem[];
 }
 
+interface CompactDeficitMapApiResponse {
+  year: number;
+  deficits: Record<string, [string, string, number]>;
+}
+
 interface DeficitMapApiResponse {
   year: number;
   deficits: Array<{
@@ -263,8 +268,18 @@ export const fetchDeficitMap = async (reporterId: number = 840): Promise<Deficit
     const params = new URLSearchParams();
     params.append('reporter_id', reporterId.toString());
     
-    const response = await axios.get<DeficitMapResponse>(`${API_BASE_URL}/api/trade/deficit-map?${params.toString()}`);
-    return response.data;
+    // The compact endpoint sends each country as [country_id, country_name, deficit_thousands],
+    // keyed by ISO3 code
+    const response = await axios.get<CompactDeficitMapApiResponse>(`${API_BASE_URL}/api/trade/deficit-map/compact?${params.toString()}`);
+    return {
+      year: response.data.year,
+      deficits: Object.entries(response.data.deficits).map(([country_code, [country_id, country_name, deficit_thousands]]) => ({
+        country_id,
+        country_code,
+        country_name,
+        deficit_thousands
+      }))
+    };
   } catch (error) {
     console.error('Error fetching deficit map data:', error);
     throw error;